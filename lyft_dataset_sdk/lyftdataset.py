@@ -3,33 +3,186 @@
 # Licensed under the Creative Commons [see licence.txt]
 # Modified by Vladimir Iglovikov 2019.
 
+import hashlib
 import json
 import math
 import os
+import pickle
 import sys
+import tempfile
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, NamedTuple, Optional, Tuple
 
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
-import sklearn.metrics
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
 from PIL import Image
 from pyquaternion import Quaternion
+from scipy.spatial import cKDTree
 from tqdm import tqdm
 
 from lyft_dataset_sdk.utils.data_classes import Box, LidarPointCloud, RadarPointCloud  # NOQA
-from lyft_dataset_sdk.utils.geometry_utils import BoxVisibility, box_in_image, view_points  # NOQA
+from lyft_dataset_sdk.utils.geometry_utils import (  # NOQA
+    BoxVisibility,
+    box_in_image,
+    qmul,
+    quat_to_rotmat,
+    quat_yaw,
+    slerp_quaternions,
+    view_points,
+)
 from lyft_dataset_sdk.utils.map_mask import MapMask
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 PYTHON_VERSION = sys.version_info[0]
 
 if not PYTHON_VERSION == 3:
     raise ValueError("LyftDataset sdk only supports Python version 3.")
 
+# Tables which make up most of the json data on disk.
+LARGE_TABLES = ("sample_data", "sample_annotation")
+
+# Version of the layout of the cache written with use_cache=True. Bump it when the pickled state changes in a way
+# that the modification times of the SDK sources do not capture.
+CACHE_VERSION = 1
+
+
+def _read_json_records(f, large: bool = False):
+    """Reads the list of records of a table from a json file, using the fastest parser that is installed.
+
+    Args:
+        f: File object opened in binary mode.
+        large: Whether this is one of the large tables, for which pysimdjson is preferred.
+
+    Returns: Iterable over the table records.
+
+    """
+    if large and simdjson is not None:
+        return simdjson.Parser().parse(f.read()).as_list()
+    if orjson is not None:
+        return orjson.loads(f.read())
+    if ijson is not None:
+        return ijson.items(f, "item", use_float=True)
+    return json.load(f)
+
+
+def _cache_transform(record: dict) -> dict:
+    """Decorates an ego_pose or calibrated_sensor record with its transform as arrays, Quaternions and rotation
+    matrices. These are static per record, so they are computed on first use and reused afterwards.
+
+    Args:
+        record: Record with "translation" (x, y, z) and "rotation" (w, x, y, z) fields.
+
+    Returns: The record, with the following fields set:
+        "_translation_np": <np.float: 3>, read-only. The translation.
+        "_intrinsic": <np.float: 3, 3>, read-only. The camera intrinsic, only set for camera calibrated_sensor records.
+        "_quat", "_quat_inv": The rotation and its inverse.
+        "_rotmat", "_rotmat_T": <np.float: 3, 3>, read-only. The rotation matrix and its transpose.
+        "_yaw": Yaw angle of the rotation in radians.
+        "_flat_quat_inv": Inverse of the rotation around the z axis by "_yaw", i.e. from world to a frame that is
+            aligned with the record's heading but parallel to the world z plane.
+
+    """
+    if "_quat" not in record:
+        quat = Quaternion(record["rotation"])
+        rotmat = quat_to_rotmat(*record["rotation"])
+        rotmat.flags.writeable = False
+        yaw = quat_yaw(*record["rotation"])
+        translation = np.array(record["translation"], dtype=np.float64)
+        translation.flags.writeable = False
+        if record.get("camera_intrinsic"):
+            intrinsic = np.array(record["camera_intrinsic"], dtype=np.float64)
+            intrinsic.flags.writeable = False
+            record["_intrinsic"] = intrinsic
+        record["_translation_np"] = translation
+        record["_quat"] = quat
+        record["_quat_inv"] = quat.inverse
+        record["_rotmat"] = rotmat
+        record["_rotmat_T"] = rotmat.T
+        record["_yaw"] = yaw
+        record["_flat_quat_inv"] = Quaternion(scalar=np.cos(yaw / 2), vector=[0, 0, np.sin(yaw / 2)]).inverse
+    return record
+
+
+def _cache_path(record: dict, data_path: Path) -> Path:
+    """Returns the absolute path of the file of a sample_data record. The path is built on first use and stored in
+    the record's "_path" field.
+
+    Args:
+        record: Record with a "filename" field relative to the dataset root.
+        data_path: Root of the dataset.
+
+    Returns: Absolute path of the file.
+
+    """
+    path = record.get("_path")
+    if path is None:
+        path = record["_path"] = data_path / record["filename"]
+    return path
+
+
+def _imread_reduced(
+    image_path: Path, native_size: Tuple[int, int], target_size: Tuple[int, int]
+) -> Tuple[np.ndarray, int]:
+    """Reads a color image and lets the decoder downscale it by the largest factor of 2, 4 or 8 that keeps it at least
+    as large as target_size. For JPEGs this skips most of the full resolution decode.
+
+    Args:
+        image_path: Path of the image.
+        native_size: (width, height) of the image on disk.
+        target_size: (width, height) the image is going to be resized to.
+
+    Returns: (image <np.uint8: height, width, 3> in BGR order, factor by which the image was downscaled).
+
+    """
+    reduced_flags = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+    for factor, flag in reduced_flags:
+        if native_size[0] >= factor * target_size[0] and native_size[1] >= factor * target_size[1]:
+            return cv2.imread(str(image_path), flag), factor
+    return cv2.imread(str(image_path)), 1
+
+
+class AnnotationColumns(NamedTuple):
+    """Columns of the sample_annotation table stored as arrays, row i belongs to record i of the table.
+    Indices into other tables are -1 where the token is empty."""
+
+    translation: np.ndarray  # <np.float64: n, 3>.
+    size: np.ndarray  # <np.float64: n, 3>. Width, length, height.
+    rotation: np.ndarray  # <np.float64: n, 4>. Quaternion (w, x, y, z).
+    timestamp: np.ndarray  # <np.int64: n>. Timestamp of the sample the annotation belongs to.
+    instance_idx: np.ndarray  # <np.int32: n>. Index into the instance table.
+    category_idx: np.ndarray  # <np.int32: n>. Index into the category table.
+    sample_idx: np.ndarray  # <np.int32: n>. Index into the sample table.
+    prev_idx: np.ndarray  # <np.int32: n>. Index of the previous annotation of the instance.
+    next_idx: np.ndarray  # <np.int32: n>. Index of the next annotation of the instance.
+
+
+class SceneChannelIndex(NamedTuple):
+    """The sample_data records of one sensor channel in a scene, in the order of their linked list."""
+
+    tokens: List[str]  # Sample_data tokens.
+    timestamps: np.ndarray  # <np.int64: k>.
+
 
 class LyftDataset:
     """Database class for Lyft Dataset to help query and retrieve information from the database."""
@@ -41,6 +194,7 @@ class LyftDataset:
         verbose: bool = True,
         map_resolution: float = 0.1,
         missing_tables_ok=False,
+        use_cache: bool = False,
     ):
         """Loads database and creates reverse indexes and shortcuts.
 
@@ -49,6 +203,9 @@ class LyftDataset:
             json_path: Path to the folder with json files
             verbose: Whether to print status messages during load.
             map_resolution: Resolution of maps (meters).
+            missing_tables_ok: Whether to replace missing json files with empty tables.
+            use_cache: Whether to pickle the loaded and indexed tables to a cache file in json_path, and load them from
+                there on later instantiations. The cache is rebuilt whenever one of the json files or the SDK changes.
         """
 
         self.data_path = Path(data_path).expanduser().absolute()
@@ -72,20 +229,45 @@ class LyftDataset:
 
         start_time = time.time()
 
+        if use_cache:
+            cache_path = self.__cache_path__(map_resolution, missing_tables_ok)
+            if self.__load_cache__(cache_path, verbose):
+                if verbose:
+                    print(
+                        "Done loading from {} in {:.1f} seconds.\n======".format(cache_path, time.time() - start_time)
+                    )
+                self.explorer = LyftDatasetExplorer(self)
+                return
+
+        # Mapping from token to table index for each table, filled in while the tables are loaded.
+        self._token2ind = dict()
+
+        # Mapping from (table, field) to {field value: [tokens]}, built on demand by field2token.
+        self._field2tokens = dict()
+
+        # Load the tables in a thread pool. The json parsers hold the GIL while parsing, so this only overlaps reading
+        # the files from disk, which is what dominates on network or cold storage.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                table: executor.submit(self.__load_table__, table, verbose, missing_tables_ok)
+                for table in self.table_names
+            }
+        tables = {table: future.result() for table, future in futures.items()}
+
         # Explicitly assign tables to help the IDE determine valid class members.
-        self.category = self.__load_table__("category", verbose, missing_tables_ok)
-        self.attribute = self.__load_table__("attribute", verbose, missing_tables_ok)
-        self.visibility = self.__load_table__("visibility", verbose, missing_tables_ok)
-        self.instance = self.__load_table__("instance", verbose, missing_tables_ok)
-        self.sensor = self.__load_table__("sensor", verbose, missing_tables_ok)
-        self.calibrated_sensor = self.__load_table__("calibrated_sensor", verbose, missing_tables_ok)
-        self.ego_pose = self.__load_table__("ego_pose", verbose, missing_tables_ok)
-        self.log = self.__load_table__("log", verbose, missing_tables_ok)
-        self.scene = self.__load_table__("scene", verbose, missing_tables_ok)
-        self.sample = self.__load_table__("sample", verbose, missing_tables_ok)
-        self.sample_data = self.__load_table__("sample_data", verbose, missing_tables_ok)
-        self.sample_annotation = self.__load_table__("sample_annotation", verbose, missing_tables_ok)
-        self.map = self.__load_table__("map", verbose, missing_tables_ok)
+        self.category = tables["category"]
+        self.attribute = tables["attribute"]
+        self.visibility = tables["visibility"]
+        self.instance = tables["instance"]
+        self.sensor = tables["sensor"]
+        self.calibrated_sensor = tables["calibrated_sensor"]
+        self.ego_pose = tables["ego_pose"]
+        self.log = tables["log"]
+        self.scene = tables["scene"]
+        self.sample = tables["sample"]
+        self.sample_data = tables["sample_data"]
+        self.sample_annotation = tables["sample_annotation"]
+        self.map = tables["map"]
 
         # Initialize map mask for each map record.
         for map_record in self.map:
@@ -99,22 +281,130 @@ class LyftDataset:
         # Make reverse indexes for common lookups.
         self.__make_reverse_index__(verbose)
 
+        if use_cache:
+            self.__save_cache__(cache_path, verbose)
+
         # Initialize LyftDatasetExplorer class
         self.explorer = LyftDatasetExplorer(self)
 
     def __load_table__(self, table_name, verbose=False, missing_ok=False) -> dict:
-        """Loads a table."""
+        """Loads a table and stores the mapping from token to table index for it.
+
+        The json is parsed with pysimdjson (large tables only) or orjson if installed. Otherwise, if ijson is installed
+        the records are streamed from disk one at a time, which avoids holding the whole parsed document in memory
+        next to the resulting table. The standard library json module is the last resort.
+        """
         filepath = str(self.json_path.joinpath("{}.json".format(table_name)))
 
         if not os.path.isfile(filepath) and missing_ok:
             if verbose:
                 print("JSON file {}.json missing, replacing table with empty dict".format(table_name))
+            self._token2ind[table_name] = dict()
             return {}
 
-        with open(filepath) as f:
-            table = json.load(f)
+        table = []
+        token2ind = dict()
+        with open(filepath, "rb") as f:
+            records = _read_json_records(f, large=table_name in LARGE_TABLES)
+            for ind, record in enumerate(records):
+                table.append(record)
+                token2ind[record["token"]] = ind
+
+        self._token2ind[table_name] = token2ind
         return table
 
+    def __cache_path__(self, map_resolution: float, missing_tables_ok: bool) -> Path:
+        """Returns the path of the cache file for the current json files, data path and SDK version.
+
+        The file name starts with a prefix identifying the data path, map resolution and whether missing tables are
+        allowed, followed by a digest of the json files and of all SDK sources, since the cache also pickles objects
+        such as MapMask.
+
+        Args:
+            map_resolution: Resolution of maps (meters).
+            missing_tables_ok: Whether missing json files are replaced with empty tables.
+
+        Returns: Path of the cache file.
+
+        """
+        prefix = hashlib.sha1(repr((str(self.data_path), map_resolution, missing_tables_ok)).encode("utf-8"))
+        prefix = prefix.hexdigest()[:16]
+
+        package_path = Path(__file__).parent
+        filepaths = sorted(package_path.glob("**/*.py"))
+        filepaths += [self.json_path / "{}.json".format(table) for table in self.table_names]
+        key = [CACHE_VERSION]
+        for filepath in filepaths:
+            if filepath.is_file():
+                stat = filepath.stat()
+                key.append((str(filepath), stat.st_mtime_ns, stat.st_size))
+            else:
+                key.append((str(filepath), None, None))
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.json_path / ".cache_{}_{}.pkl".format(prefix, digest)
+
+    def __load_cache__(self, cache_path: Path, verbose: bool) -> bool:
+        """Restores the loaded and indexed tables from a cache file written by __save_cache__.
+
+        Args:
+            cache_path: Path of the cache file.
+            verbose: Whether to print outputs.
+
+        Returns: Whether the cache was loaded.
+
+        """
+        if not cache_path.is_file():
+            return False
+
+        try:
+            with open(str(cache_path), "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            if verbose:
+                print("Could not load cache {}, rebuilding it: {}".format(cache_path, e))
+            return False
+
+        self.__dict__.update(state)
+        return True
+
+    def __save_cache__(self, cache_path: Path, verbose: bool) -> None:
+        """Pickles the loaded and indexed tables to a cache file, and removes caches of older versions of the data
+        or SDK for the same data path and map resolution. Caches of other configurations are left alone.
+
+        Args:
+            cache_path: Path of the cache file.
+            verbose: Whether to print outputs.
+
+        """
+        state = {key: value for key, value in self.__dict__.items() if key != "explorer"}
+        tmp_path = None
+        try:
+            # Write to a temp file unique to this process and publish it atomically, several processes may build the
+            # same cache at once.
+            with tempfile.NamedTemporaryFile(dir=str(self.json_path), suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # NamedTemporaryFile is only readable by its owner, give the cache the usual permissions so other users of
+            # a shared dataset directory can load it.
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+            os.replace(tmp_path, str(cache_path))
+            tmp_path = None
+            prefix = cache_path.name.rsplit("_", 1)[0]
+            for old_cache_path in self.json_path.glob("{}_*.pkl".format(prefix)):
+                if old_cache_path != cache_path:
+                    try:
+                        old_cache_path.unlink()
+                    except FileNotFoundError:
+                        pass
+        except OSError as e:
+            if verbose:
+                print("Could not write cache {}: {}".format(cache_path, e))
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     def __make_reverse_index__(self, verbose: bool) -> None:
         """De-normalizes database to create reverse indices for common cases.
 
@@ -127,39 +417,73 @@ class LyftDataset:
         if verbose:
             print("Reverse indexing ...")
 
-        # Store the mapping from token to table index for each table.
-        self._token2ind = dict()
-        for table in self.table_names:
-            self._token2ind[table] = dict()
+        # Bind the tables and token indexes used below, the loops run over every sample_data and annotation record.
+        sample, category, instance = self.sample, self.category, self.instance
+        sensor, calibrated_sensor = self.sensor, self.calibrated_sensor
+        sample_token2ind = self._token2ind["sample"]
+        ann_token2ind = self._token2ind["sample_annotation"]
+        category_token2ind = self._token2ind["category"]
+        instance_token2ind = self._token2ind["instance"]
+        sensor_token2ind = self._token2ind["sensor"]
+        cs_token2ind = self._token2ind["calibrated_sensor"]
 
-            for ind, member in enumerate(getattr(self, table)):
-                self._token2ind[table][member["token"]] = ind
+        # Reverse-index samples with sample_data and annotations.
+        for record in sample:
+            record["data"] = {}
+            record["anns"] = []
 
-        # Decorate (adds short-cut) sample_annotation table with for category name.
+        # Decorate (adds short-cut) sample_annotation table with for category name and reverse-index it in the same
+        # pass. Also collect the columns of the table as arrays, so velocities, interpolations and statistics don't
+        # need to touch the records.
+        translations, sizes, rotations, timestamps = [], [], [], []
+        instance_inds, category_inds, sample_inds, prev_inds, next_inds = [], [], [], [], []
         for record in self.sample_annotation:
-            inst = self.get("instance", record["instance_token"])
-            record["category_name"] = self.get("category", inst["category_token"])["name"]
+            instance_ind = instance_token2ind[record["instance_token"]]
+            category_ind = category_token2ind[instance[instance_ind]["category_token"]]
+            record["category_name"] = category[category_ind]["name"]
+
+            sample_ind = sample_token2ind[record["sample_token"]]
+            sample_record = sample[sample_ind]
+            sample_record["anns"].append(record["token"])
+
+            translations.append(record["translation"])
+            sizes.append(record["size"])
+            rotations.append(record["rotation"])
+            timestamps.append(sample_record["timestamp"])
+            instance_inds.append(instance_ind)
+            category_inds.append(category_ind)
+            sample_inds.append(sample_ind)
+            prev_inds.append(ann_token2ind.get(record["prev"], -1))
+            next_inds.append(ann_token2ind.get(record["next"], -1))
+
+        self._ann_columns = AnnotationColumns(
+            translation=np.array(translations, dtype=np.float64).reshape(-1, 3),
+            size=np.array(sizes, dtype=np.float64).reshape(-1, 3),
+            rotation=np.array(rotations, dtype=np.float64).reshape(-1, 4),
+            timestamp=np.array(timestamps, dtype=np.int64),
+            instance_idx=np.array(instance_inds, dtype=np.int32),
+            category_idx=np.array(category_inds, dtype=np.int32),
+            sample_idx=np.array(sample_inds, dtype=np.int32),
+            prev_idx=np.array(prev_inds, dtype=np.int32),
+            next_idx=np.array(next_inds, dtype=np.int32),
+        )
 
-        # Decorate (adds short-cut) sample_data with sensor information.
+        # The sample.prev / sample.next linked lists as index arrays (-1 at the ends of a scene) and the number of
+        # annotations per sample, so scenes can be walked without token lookups.
+        get_sample_ind = sample_token2ind.get
+        self._sample_prev_idx = np.array([get_sample_ind(record["prev"], -1) for record in sample], dtype=np.int32)
+        self._sample_next_idx = np.array([get_sample_ind(record["next"], -1) for record in sample], dtype=np.int32)
+        self._sample_anns_count = np.bincount(self._ann_columns.sample_idx, minlength=len(sample)).astype(np.int32)
+
+        # Decorate (adds short-cut) sample_data with sensor information and reverse-index key frames in the same pass.
         for record in self.sample_data:
-            cs_record = self.get("calibrated_sensor", record["calibrated_sensor_token"])
-            sensor_record = self.get("sensor", cs_record["sensor_token"])
+            cs_record = calibrated_sensor[cs_token2ind[record["calibrated_sensor_token"]]]
+            sensor_record = sensor[sensor_token2ind[cs_record["sensor_token"]]]
             record["sensor_modality"] = sensor_record["modality"]
             record["channel"] = sensor_record["channel"]
 
-        # Reverse-index samples with sample_data and annotations.
-        for record in self.sample:
-            record["data"] = {}
-            record["anns"] = []
-
-        for record in self.sample_data:
             if record["is_key_frame"]:
-                sample_record = self.get("sample", record["sample_token"])
-                sample_record["data"][record["channel"]] = record["token"]
-
-        for ann_record in self.sample_annotation:
-            sample_record = self.get("sample", ann_record["sample_token"])
-            sample_record["anns"].append(ann_record["token"])
+                sample[sample_token2ind[record["sample_token"]]]["data"][record["channel"]] = record["token"]
 
         # Add reverse indices from log records to map records.
         if "log_tokens" not in self.map[0].keys():
@@ -181,13 +505,11 @@ class LyftDataset:
             table_name: Table name.
             token: Token of the record.
 
-        Returns: Table record.
+        Returns: Table record. Raises KeyError if the table or the token does not exist.
 
         """
-
-        assert table_name in self.table_names, "Table {} not found".format(table_name)
-
-        return getattr(self, table_name)[self.getind(table_name, token)]
+        ind = self._token2ind[table_name][token]
+        return getattr(self, table_name)[ind]
 
     def getind(self, table_name: str, token: str) -> int:
         """Returns the index of the record in a table in constant runtime.
@@ -204,7 +526,9 @@ class LyftDataset:
     def field2token(self, table_name: str, field: str, query) -> List[str]:
         """Query all records for a certain field value, and returns the tokens for the matching records.
 
-        Runs in linear time.
+        The first query on a (table, field) pair runs in linear time and builds a hash index over the field values,
+        later queries run in constant time. Fields with unhashable values (e.g. lists) are always scanned linearly.
+        The index is built once and does not track later changes to the table.
 
         Args:
             table_name: Table name.
@@ -214,6 +538,23 @@ class LyftDataset:
         Returns: List of tokens for the matching records.
 
         """
+        key = (table_name, field)
+        if key not in self._field2tokens:
+            index = defaultdict(list)
+            try:
+                for member in getattr(self, table_name):
+                    index[member[field]].append(member["token"])
+            except TypeError:
+                index = None
+            self._field2tokens[key] = index
+
+        index = self._field2tokens[key]
+        if index is not None:
+            try:
+                return list(index.get(query, []))
+            except TypeError:
+                pass
+
         matches = []
         for member in getattr(self, table_name):
             if member[field] == query:
@@ -230,8 +571,7 @@ class LyftDataset:
 
         """
 
-        sd_record = self.get("sample_data", sample_data_token)
-        return self.data_path / sd_record["filename"]
+        return _cache_path(self.get("sample_data", sample_data_token), self.data_path)
 
     def get_sample_data(
         self,
@@ -256,14 +596,14 @@ class LyftDataset:
 
         # Retrieve sensor & pose records
         sd_record = self.get("sample_data", sample_data_token)
-        cs_record = self.get("calibrated_sensor", sd_record["calibrated_sensor_token"])
+        cs_record = _cache_transform(self.get("calibrated_sensor", sd_record["calibrated_sensor_token"]))
         sensor_record = self.get("sensor", cs_record["sensor_token"])
-        pose_record = self.get("ego_pose", sd_record["ego_pose_token"])
+        pose_record = _cache_transform(self.get("ego_pose", sd_record["ego_pose_token"]))
 
         data_path = self.get_sample_data_path(sample_data_token)
 
         if sensor_record["modality"] == "camera":
-            cam_intrinsic = np.array(cs_record["camera_intrinsic"])
+            cam_intrinsic = cs_record["_intrinsic"]
             imsize = (sd_record["width"], sd_record["height"])
         else:
             cam_intrinsic = None
@@ -275,26 +615,21 @@ class LyftDataset:
         else:
             boxes = self.get_boxes(sample_data_token)
 
-        # Make list of Box objects including coord system transforms.
-        box_list = []
-        for box in boxes:
-            if flat_vehicle_coordinates:
-                # Move box to ego vehicle coord system parallel to world z plane
-                ypr = Quaternion(pose_record["rotation"]).yaw_pitch_roll
-                yaw = ypr[0]
-
-                box.translate(-np.array(pose_record["translation"]))
-                box.rotate(Quaternion(scalar=np.cos(yaw / 2), vector=[0, 0, np.sin(yaw / 2)]).inverse)
+        # Transform all boxes at once, including coord system transforms.
+        if flat_vehicle_coordinates:
+            # Move box to ego vehicle coord system parallel to world z plane
+            Box.transform_batch(boxes, -pose_record["_translation_np"], pose_record["_flat_quat_inv"])
 
-            else:
-                # Move box to ego vehicle coord system
-                box.translate(-np.array(pose_record["translation"]))
-                box.rotate(Quaternion(pose_record["rotation"]).inverse)
+        else:
+            # Move box to ego vehicle coord system
+            Box.transform_batch(boxes, -pose_record["_translation_np"], pose_record["_quat_inv"])
 
-                #  Move box to sensor coord system
-                box.translate(-np.array(cs_record["translation"]))
-                box.rotate(Quaternion(cs_record["rotation"]).inverse)
+            #  Move box to sensor coord system
+            Box.transform_batch(boxes, -cs_record["_translation_np"], cs_record["_quat_inv"])
 
+        # Make list of Box objects.
+        box_list = []
+        for box in boxes:
             if sensor_record["modality"] == "camera" and not box_in_image(
                 box, cam_intrinsic, imsize, vis_level=box_vis_level
             ):
@@ -302,6 +637,9 @@ class LyftDataset:
 
             box_list.append(box)
 
+        if cam_intrinsic is not None:
+            cam_intrinsic = cam_intrinsic.copy()
+
         return data_path, box_list, cam_intrinsic
 
     def get_box(self, sample_annotation_token: str) -> Box:
@@ -313,7 +651,7 @@ class LyftDataset:
         Returns:
 
         """
-        record = self.get("sample_annotation", sample_annotation_token)
+        record = self.sample_annotation[self._token2ind["sample_annotation"][sample_annotation_token]]
         return Box(
             record["translation"],
             record["size"],
@@ -339,20 +677,27 @@ class LyftDataset:
 
         # Retrieve sensor & pose records
         sd_record = self.get("sample_data", sample_data_token)
-        curr_sample_record = self.get("sample", sd_record["sample_token"])
+        curr_sample_ind = self._token2ind["sample"][sd_record["sample_token"]]
+        curr_sample_record = self.sample[curr_sample_ind]
+        prev_sample_ind = self._sample_prev_idx[curr_sample_ind]
 
-        if curr_sample_record["prev"] == "" or sd_record["is_key_frame"]:
+        if prev_sample_ind < 0 or sd_record["is_key_frame"]:
             # If no previous annotations available, or if sample_data is keyframe just return the current ones.
             boxes = list(map(self.get_box, curr_sample_record["anns"]))
 
         else:
-            prev_sample_record = self.get("sample", curr_sample_record["prev"])
+            prev_sample_record = self.sample[prev_sample_ind]
 
-            curr_ann_recs = [self.get("sample_annotation", token) for token in curr_sample_record["anns"]]
-            prev_ann_recs = [self.get("sample_annotation", token) for token in prev_sample_record["anns"]]
+            # Bind the annotation table and its index once instead of dispatching on the table name per record.
+            sample_annotation = self.sample_annotation
+            ann_token2ind = self._token2ind["sample_annotation"]
+            curr_ann_inds = [ann_token2ind[token] for token in curr_sample_record["anns"]]
 
-            # Maps instance tokens to prev_ann records
-            prev_inst_map = {entry["instance_token"]: entry for entry in prev_ann_recs}
+            # Maps instances to prev_ann indices, and pairs every current annotation with it (-1 if missing).
+            instance_idx = self._ann_columns.instance_idx
+            prev_ann_inds = [ann_token2ind[token] for token in prev_sample_record["anns"]]
+            prev_inst_map = dict(zip(instance_idx[prev_ann_inds].tolist(), prev_ann_inds))
+            prev_ann_inds = [prev_inst_map.get(inst, -1) for inst in instance_idx[curr_ann_inds].tolist()]
 
             t0 = prev_sample_record["timestamp"]
             t1 = curr_sample_record["timestamp"]
@@ -360,31 +705,24 @@ class LyftDataset:
 
             # There are rare situations where the timestamps in the DB are off so ensure that t0 < t < t1.
             t = max(t0, min(t1, t))
+            amount = (t - t0) / (t1 - t0)
+
+            # Interpolate all centers & orientations at once. Rows without a previous annotation are not used.
+            columns = self._ann_columns
+            centers = columns.translation[prev_ann_inds]
+            centers += amount * (columns.translation[curr_ann_inds] - centers)
+            rotations = slerp_quaternions(columns.rotation[prev_ann_inds], columns.rotation[curr_ann_inds], amount)
 
             boxes = []
-            for curr_ann_rec in curr_ann_recs:
-
-                if curr_ann_rec["instance_token"] in prev_inst_map:
-                    # If the annotated instance existed in the previous frame, interpolate center & orientation.
-                    prev_ann_rec = prev_inst_map[curr_ann_rec["instance_token"]]
-
-                    # Interpolate center.
-                    center = [
-                        np.interp(t, [t0, t1], [c0, c1])
-                        for c0, c1 in zip(prev_ann_rec["translation"], curr_ann_rec["translation"])
-                    ]
-
-                    # Interpolate orientation.
-                    rotation = Quaternion.slerp(
-                        q0=Quaternion(prev_ann_rec["rotation"]),
-                        q1=Quaternion(curr_ann_rec["rotation"]),
-                        amount=(t - t0) / (t1 - t0),
-                    )
+            for curr_ind, prev_ind, center, rotation in zip(curr_ann_inds, prev_ann_inds, centers, rotations):
+                curr_ann_rec = sample_annotation[curr_ind]
 
+                if prev_ind >= 0:
+                    # If the annotated instance existed in the previous frame, use interpolated center & orientation.
                     box = Box(
                         center,
                         curr_ann_rec["size"],
-                        rotation,
+                        Quaternion(rotation),
                         name=curr_ann_rec["category_name"],
                         token=curr_ann_rec["token"],
                     )
@@ -411,31 +749,22 @@ class LyftDataset:
 
         """
 
-        current = self.get("sample_annotation", sample_annotation_token)
-        has_prev = current["prev"] != ""
-        has_next = current["next"] != ""
+        columns = self._ann_columns
+        ind = self._token2ind["sample_annotation"][sample_annotation_token]
+        prev_ind = columns.prev_idx[ind]
+        next_ind = columns.next_idx[ind]
+        has_prev = prev_ind >= 0
+        has_next = next_ind >= 0
 
         # Cannot estimate velocity for a single annotation.
         if not has_prev and not has_next:
             return np.array([np.nan, np.nan, np.nan])
 
-        if has_prev:
-            first = self.get("sample_annotation", current["prev"])
-        else:
-            first = current
-
-        if has_next:
-            last = self.get("sample_annotation", current["next"])
-        else:
-            last = current
-
-        pos_last = np.array(last["translation"])
-        pos_first = np.array(first["translation"])
-        pos_diff = pos_last - pos_first
+        first = prev_ind if has_prev else ind
+        last = next_ind if has_next else ind
 
-        time_last = 1e-6 * self.get("sample", last["sample_token"])["timestamp"]
-        time_first = 1e-6 * self.get("sample", first["sample_token"])["timestamp"]
-        time_diff = time_last - time_first
+        pos_diff = columns.translation[last] - columns.translation[first]
+        time_diff = 1e-6 * (columns.timestamp[last] - columns.timestamp[first])
 
         if has_next and has_prev:
             # If doing centered difference, allow for up to double the max_time_diff.
@@ -494,6 +823,7 @@ class LyftDataset:
         nsweeps: int = 1,
         out_path: str = None,
         underlay_map: bool = False,
+        max_points: Optional[int] = 50000,
     ) -> None:
         return self.explorer.render_sample_data(
             sample_data_token,
@@ -504,6 +834,7 @@ class LyftDataset:
             num_sweeps=nsweeps,
             out_path=out_path,
             underlay_map=underlay_map,
+            max_points=max_points,
         )
 
     def render_annotation(
@@ -544,6 +875,8 @@ class LyftDatasetExplorer:
 
     def __init__(self, lyftd: LyftDataset):
         self.lyftd = lyftd
+        self._colors_normalized = dict()  # Category name -> color scaled to [0, 1], filled on first use.
+        self._render_counters = dict()  # Output directory -> number of the next render_sample_data figure.
 
     @staticmethod
     def get_color(category_name: str) -> Tuple[int, int, int]:
@@ -567,34 +900,92 @@ class LyftDatasetExplorer:
         else:
             return 255, 0, 255  # Magenta
 
+    def get_color_normalized(self, category_name: str) -> np.ndarray:
+        """Returns the color of get_color scaled to [0, 1], as used by matplotlib. The colors are computed once per
+        category name and shared between calls.
+
+        Args:
+            category_name: Name of the category.
+
+        Returns: <np.float: 3>. Read-only RGB color.
+
+        """
+        color = self._colors_normalized.get(category_name)
+        if color is None:
+            color = np.array(self.get_color(category_name)) / 255.0
+            color.flags.writeable = False
+            self._colors_normalized[category_name] = color
+        return color
+
+    def _render_boxes(self, ax: Axes, boxes: List[Box], view: np.ndarray, normalize: bool = False) -> None:
+        """Renders boxes on a matplotlib axis like Box.render does, but draws all boxes of a category as a single
+        LineCollection instead of 13 separate lines per box.
+
+        Args:
+            ax: Axes onto which to render.
+            boxes: Boxes to render.
+            view: <np.float32: n, n>. Define a projection if needed (e.g. for drawing projection in an image).
+            normalize: Whether to normalize the remaining coordinate.
+
+        """
+        segments_by_name = defaultdict(list)
+        for box in boxes:
+            segments_by_name[box.name].append(box.line_segments(view=view, normalize=normalize))
+
+        for name, segments in segments_by_name.items():
+            color = self.get_color_normalized(name)
+            ax.add_collection(LineCollection(np.concatenate(segments), colors=[color], linewidths=2))
+        ax.autoscale_view()
+
+    def _precompute_scene_index(self, scene_token: str, channel: str) -> SceneChannelIndex:
+        """Walks the sample_data records of a channel once, starting at the first sample of a scene, so renderers can
+        index and binary search them instead of following the linked list.
+
+        Args:
+            scene_token: Unique identifier of the scene.
+            channel: Sensor channel, e.g. "CAM_FRONT".
+
+        Returns: The tokens and timestamps of the records.
+
+        """
+        get = self.lyftd.get
+        first_sample_rec = get("sample", get("scene", scene_token)["first_sample_token"])
+
+        records = [get("sample_data", first_sample_rec["data"][channel])]
+        while records[-1]["next"] != "":
+            records.append(get("sample_data", records[-1]["next"]))
+
+        return SceneChannelIndex(
+            tokens=[record["token"] for record in records],
+            timestamps=np.array([record["timestamp"] for record in records], dtype=np.int64),
+        )
+
     def list_categories(self) -> None:
         """Print categories, counts and stats."""
 
         print("Category stats")
 
-        # Add all annotations
-        categories = dict()
-        for record in self.lyftd.sample_annotation:
-            if record["category_name"] not in categories:
-                categories[record["category_name"]] = []
-            categories[record["category_name"]].append(record["size"] + [record["size"][1] / record["size"][0]])
+        # Group all annotations by category name. Stats are width, length, height and length / width aspect ratio.
+        columns = self.lyftd._ann_columns
+        names, name_inds = np.unique([record["name"] for record in self.lyftd.category], return_inverse=True)
+        groups = name_inds.reshape(-1)[columns.category_idx]
+        stats = np.hstack((columns.size, columns.size[:, 1:2] / columns.size[:, 0:1]))
+
+        counts = np.bincount(groups, minlength=len(names))
+        means = np.stack([np.bincount(groups, weights=stat, minlength=len(names)) for stat in stats.T], axis=1)
+        means /= np.maximum(counts, 1)[:, None]
+        sq_diffs = (stats - means[groups]) ** 2
+        stds = np.stack([np.bincount(groups, weights=sq_diff, minlength=len(names)) for sq_diff in sq_diffs.T], axis=1)
+        stds = np.sqrt(stds / np.maximum(counts, 1)[:, None])
 
         # Print stats
-        for name, stats in sorted(categories.items()):
-            stats = np.array(stats)
+        for name, count, mean, std in zip(names, counts, means, stds):
+            if count == 0:
+                continue
             print(
                 "{:27} n={:5}, width={:5.2f}\u00B1{:.2f}, len={:5.2f}\u00B1{:.2f}, height={:5.2f}\u00B1{:.2f}, "
                 "lw_aspect={:5.2f}\u00B1{:.2f}".format(
-                    name[:27],
-                    stats.shape[0],
-                    np.mean(stats[:, 0]),
-                    np.std(stats[:, 0]),
-                    np.mean(stats[:, 1]),
-                    np.std(stats[:, 1]),
-                    np.mean(stats[:, 2]),
-                    np.std(stats[:, 2]),
-                    np.mean(stats[:, 3]),
-                    np.std(stats[:, 3]),
+                    name[:27], count, mean[0], std[0], mean[1], std[1], mean[2], std[2], mean[3], std[3]
                 )
             )
 
@@ -614,12 +1005,16 @@ class LyftDatasetExplorer:
     def list_scenes(self) -> None:
         """ Lists all scenes with some meta data. """
 
+        sample_next_idx = self.lyftd._sample_next_idx.tolist()
+        sample_anns_count = self.lyftd._sample_anns_count.tolist()
+        sample_token2ind = self.lyftd._token2ind["sample"]
+
         def ann_count(record):
             count = 0
-            sample = self.lyftd.get("sample", record["first_sample_token"])
-            while not sample["next"] == "":
-                count += len(sample["anns"])
-                sample = self.lyftd.get("sample", sample["next"])
+            ind = sample_token2ind[record["first_sample_token"]]
+            while sample_next_idx[ind] >= 0:
+                count += sample_anns_count[ind]
+                ind = sample_next_idx[ind]
             return count
 
         recs = [
@@ -678,33 +1073,33 @@ class LyftDatasetExplorer:
 
         cam = self.lyftd.get("sample_data", camera_token)
         pointsensor = self.lyftd.get("sample_data", pointsensor_token)
-        pcl_path = self.lyftd.data_path / pointsensor["filename"]
+        pcl_path = _cache_path(pointsensor, self.lyftd.data_path)
         if pointsensor["sensor_modality"] == "lidar":
             pc = LidarPointCloud.from_file(pcl_path)
         else:
             pc = RadarPointCloud.from_file(pcl_path)
-        im = Image.open(str(self.lyftd.data_path / cam["filename"]))
+        im = Image.open(str(_cache_path(cam, self.lyftd.data_path)))
 
         # Points live in the point sensor frame. So they need to be transformed via global to the image plane.
         # First step: transform the point-cloud to the ego vehicle frame for the timestamp of the sweep.
-        cs_record = self.lyftd.get("calibrated_sensor", pointsensor["calibrated_sensor_token"])
-        pc.rotate(Quaternion(cs_record["rotation"]).rotation_matrix)
-        pc.translate(np.array(cs_record["translation"]))
+        cs_record = _cache_transform(self.lyftd.get("calibrated_sensor", pointsensor["calibrated_sensor_token"]))
+        pc.rotate(cs_record["_rotmat"])
+        pc.translate(cs_record["_translation_np"])
 
         # Second step: transform to the global frame.
-        poserecord = self.lyftd.get("ego_pose", pointsensor["ego_pose_token"])
-        pc.rotate(Quaternion(poserecord["rotation"]).rotation_matrix)
-        pc.translate(np.array(poserecord["translation"]))
+        poserecord = _cache_transform(self.lyftd.get("ego_pose", pointsensor["ego_pose_token"]))
+        pc.rotate(poserecord["_rotmat"])
+        pc.translate(poserecord["_translation_np"])
 
         # Third step: transform into the ego vehicle frame for the timestamp of the image.
-        poserecord = self.lyftd.get("ego_pose", cam["ego_pose_token"])
-        pc.translate(-np.array(poserecord["translation"]))
-        pc.rotate(Quaternion(poserecord["rotation"]).rotation_matrix.T)
+        poserecord = _cache_transform(self.lyftd.get("ego_pose", cam["ego_pose_token"]))
+        pc.translate(-poserecord["_translation_np"])
+        pc.rotate(poserecord["_rotmat_T"])
 
         # Fourth step: transform into the camera.
-        cs_record = self.lyftd.get("calibrated_sensor", cam["calibrated_sensor_token"])
-        pc.translate(-np.array(cs_record["translation"]))
-        pc.rotate(Quaternion(cs_record["rotation"]).rotation_matrix.T)
+        cs_record = _cache_transform(self.lyftd.get("calibrated_sensor", cam["calibrated_sensor_token"]))
+        pc.translate(-cs_record["_translation_np"])
+        pc.rotate(cs_record["_rotmat_T"])
 
         # Fifth step: actually take a "picture" of the point cloud.
         # Grab the depths (camera frame z axis points away from the camera).
@@ -713,16 +1108,20 @@ class LyftDatasetExplorer:
         # Retrieve the color from the depth.
         coloring = depths
 
-        # Take the actual picture (matrix multiplication with camera-matrix + renormalization).
-        points = view_points(pc.points[:3, :], np.array(cs_record["camera_intrinsic"]), normalize=True)
+        # Take the actual picture (matrix multiplication with camera-matrix + renormalization). This is view_points,
+        # but kept in the float32 of the point cloud, which is plenty for pixel coordinates and halves the memory
+        # traffic of the projection and the mask below.
+        points = np.dot(cs_record["_intrinsic"].astype(np.float32), pc.points[:3, :])
+        points[:2, :] /= points[2:3, :]
+        points[2, :] = 1
 
         # Remove points that are either outside or behind the camera. Leave a margin of 1 pixel for aesthetic reasons.
-        mask = np.ones(depths.shape[0], dtype=bool)
-        mask = np.logical_and(mask, depths > 0)
-        mask = np.logical_and(mask, points[0, :] > 1)
-        mask = np.logical_and(mask, points[0, :] < im.size[0] - 1)
-        mask = np.logical_and(mask, points[1, :] > 1)
-        mask = np.logical_and(mask, points[1, :] < im.size[1] - 1)
+        # The conditions are combined in place to avoid allocating a new mask per condition.
+        mask = depths > 0
+        mask &= points[0, :] > 1
+        mask &= points[0, :] < im.size[0] - 1
+        mask &= points[1, :] > 1
+        mask &= points[1, :] < im.size[1] - 1
         points = points[:, mask]
         coloring = coloring[mask]
 
@@ -857,10 +1256,17 @@ class LyftDatasetExplorer:
 
         cropped = crop_image(mask_raster, pixel_coords[0], pixel_coords[1], int(scaled_limit_px * math.sqrt(2)))
 
-        ypr_rad = Quaternion(pose["rotation"]).yaw_pitch_roll
-        yaw_deg = -math.degrees(ypr_rad[0])
+        yaw_deg = -math.degrees(quat_yaw(*pose["rotation"]))
 
-        rotated_cropped = np.array(Image.fromarray(cropped).rotate(yaw_deg))
+        # Rotate around the center of the crop without leaving numpy. Nearest neighbour sampling around the center
+        # pixel matches PIL's Image.rotate defaults. Close to the map edge the crop can be empty, which cv2 rejects.
+        cropped = np.ascontiguousarray(cropped)
+        height, width = cropped.shape[:2]
+        if cropped.size == 0:
+            rotated_cropped = cropped
+        else:
+            rotation = cv2.getRotationMatrix2D(((width - 1) / 2, (height - 1) / 2), yaw_deg, 1.0)
+            rotated_cropped = cv2.warpAffine(cropped, rotation, (width, height), flags=cv2.INTER_NEAREST)
         ego_centric_map = crop_image(
             rotated_cropped, rotated_cropped.shape[1] / 2, rotated_cropped.shape[0] / 2, scaled_limit_px
         )
@@ -878,6 +1284,7 @@ class LyftDatasetExplorer:
         num_sweeps: int = 1,
         out_path: str = None,
         underlay_map: bool = False,
+        max_points: Optional[int] = 50000,
     ):
         """Render sample data onto axis.
 
@@ -890,11 +1297,18 @@ class LyftDatasetExplorer:
             num_sweeps: Number of sweeps for lidar and radar.
             out_path: Optional path to save the rendered figure to disk.
             underlay_map: When set to true, LIDAR data is plotted onto the map. This can be slow.
+            max_points: Maximum number of LIDAR points to plot. Larger point clouds are randomly subsampled, with a
+                fixed seed so renders are reproducible. Set to None to plot all points.
 
         """
 
+        get = self.lyftd.get
+
+        # Lidar and radar points are colored by their distance, saturating at the corners of the axes.
+        inv_color_dist = 1.0 / (axes_limit * math.sqrt(2))
+
         # Get sensor modality.
-        sd_record = self.lyftd.get("sample_data", sample_data_token)
+        sd_record = get("sample_data", sample_data_token)
         sensor_modality = sd_record["sensor_modality"]
 
         if sensor_modality == "lidar":
@@ -904,7 +1318,7 @@ class LyftDatasetExplorer:
             )
 
             # Get aggregated point cloud in lidar frame.
-            sample_rec = self.lyftd.get("sample", sd_record["sample_token"])
+            sample_rec = get("sample", sd_record["sample_token"])
             chan = sd_record["channel"]
             ref_chan = "LIDAR_TOP"
             pc, times = LidarPointCloud.from_file_multisweep(
@@ -912,17 +1326,17 @@ class LyftDatasetExplorer:
             )
 
             # Compute transformation matrices for lidar point cloud
-            cs_record = self.lyftd.get("calibrated_sensor", sd_record["calibrated_sensor_token"])
-            pose_record = self.lyftd.get("ego_pose", sd_record["ego_pose_token"])
+            cs_record = _cache_transform(get("calibrated_sensor", sd_record["calibrated_sensor_token"]))
+            pose_record = _cache_transform(get("ego_pose", sd_record["ego_pose_token"]))
             vehicle_from_sensor = np.eye(4)
-            vehicle_from_sensor[:3, :3] = Quaternion(cs_record["rotation"]).rotation_matrix
+            vehicle_from_sensor[:3, :3] = cs_record["_rotmat"]
             vehicle_from_sensor[:3, 3] = cs_record["translation"]
 
-            ego_yaw = Quaternion(pose_record["rotation"]).yaw_pitch_roll[0]
-            rot_vehicle_flat_from_vehicle = np.dot(
-                Quaternion(scalar=np.cos(ego_yaw / 2), vector=[0, 0, np.sin(ego_yaw / 2)]).rotation_matrix,
-                Quaternion(pose_record["rotation"]).inverse.rotation_matrix,
-            )
+            # Compose the yaw-only ego rotation with the inverse ego rotation as quaternions, then convert once.
+            ego_yaw = pose_record["_yaw"]
+            w, x, y, z = pose_record["rotation"]
+            q_vehicle_flat_from_vehicle = qmul((np.cos(ego_yaw / 2), 0.0, 0.0, np.sin(ego_yaw / 2)), (w, -x, -y, -z))
+            rot_vehicle_flat_from_vehicle = quat_to_rotmat(*q_vehicle_flat_from_vehicle)
 
             vehicle_flat_from_vehicle = np.eye(4)
             vehicle_flat_from_vehicle[:3, :3] = rot_vehicle_flat_from_vehicle
@@ -934,22 +1348,45 @@ class LyftDatasetExplorer:
             if underlay_map:
                 self.render_ego_centric_map(sample_data_token=sample_data_token, axes_limit=axes_limit, ax=ax)
 
-            # Show point cloud.
-            points = view_points(
-                pc.points[:3, :], np.dot(vehicle_flat_from_vehicle, vehicle_from_sensor), normalize=False
-            )
-            dists = np.sqrt(np.sum(pc.points[:2, :] ** 2, axis=0))
-            colors = np.minimum(1, dists / axes_limit / np.sqrt(2))
-            ax.scatter(points[0, :], points[1, :], c=colors, s=0.2)
+            # Show point cloud. The composed transform is affine, so apply its rotation and translation directly
+            # instead of going through homogeneous coordinates.
+            vehicle_flat_from_sensor = np.dot(vehicle_flat_from_vehicle, vehicle_from_sensor)
+            points = np.dot(vehicle_flat_from_sensor[:3, :3], pc.points[:3, :]) + vehicle_flat_from_sensor[:3, 3:4]
+            dists = np.hypot(pc.points[0, :], pc.points[1, :])
+            colors = np.minimum(1.0, dists * inv_color_dist)
+            if max_points is not None and points.shape[1] > max_points:
+                keep = np.sort(np.random.RandomState(0).choice(points.shape[1], max_points, replace=False))
+                points = points[:, keep]
+                colors = colors[keep]
+
+            # Plot the points as one line artist per color bin, rather than a collection with a color per point.
+            # Like scatter, the colormap spans the range of the colors, and the markers have the area of scatter's s=0.2
+            # plus its default 1 pt edge in the face color, so the points look the same.
+            num_color_bins = 32
+            cmap = plt.get_cmap()
+            color_span = np.ptp(colors) if colors.size > 0 else 0.0
+            if color_span > 0:
+                bins = ((colors - colors.min()) * (num_color_bins / color_span)).astype(np.int64)
+                np.minimum(bins, num_color_bins - 1, out=bins)
+            else:
+                bins = np.zeros(colors.shape, dtype=np.int64)
+            for color_bin in np.unique(bins).tolist():
+                in_bin = bins == color_bin
+                ax.plot(
+                    points[0, in_bin],
+                    points[1, in_bin],
+                    "o",
+                    color=cmap((color_bin + 0.5) / num_color_bins),
+                    markersize=math.sqrt(0.2),
+                    markeredgewidth=1.0,
+                )
 
             # Show ego vehicle.
             ax.plot(0, 0, "x", color="red")
 
             # Show boxes.
             if with_anns:
-                for box in boxes:
-                    c = np.array(self.get_color(box.name)) / 255.0
-                    box.render(ax, view=np.eye(4), colors=(c, c, c))
+                self._render_boxes(ax, boxes, view=np.eye(4))
 
             # Limit visible range.
             ax.set_xlim(-axes_limit, axes_limit)
@@ -957,7 +1394,7 @@ class LyftDatasetExplorer:
 
         elif sensor_modality == "radar":
             # Get boxes in lidar frame.
-            sample_rec = self.lyftd.get("sample", sd_record["sample_token"])
+            sample_rec = get("sample", sd_record["sample_token"])
             lidar_token = sample_rec["data"]["LIDAR_TOP"]
             _, boxes, _ = self.lyftd.get_sample_data(lidar_token, box_vis_level=box_vis_level)
 
@@ -970,15 +1407,14 @@ class LyftDatasetExplorer:
             )
 
             # Transform radar velocities (x is front, y is left), as these are not transformed when loading the point
-            # cloud.
-            radar_cs_record = self.lyftd.get("calibrated_sensor", sd_record["calibrated_sensor_token"])
-            lidar_sd_record = self.lyftd.get("sample_data", lidar_token)
-            lidar_cs_record = self.lyftd.get("calibrated_sensor", lidar_sd_record["calibrated_sensor_token"])
-            velocities = pc.points[8:10, :]  # Compensated velocity
-            velocities = np.vstack((velocities, np.zeros(pc.points.shape[1])))
-            velocities = np.dot(Quaternion(radar_cs_record["rotation"]).rotation_matrix, velocities)
-            velocities = np.dot(Quaternion(lidar_cs_record["rotation"]).rotation_matrix.T, velocities)
-            velocities[2, :] = np.zeros(pc.points.shape[1])
+            # cloud. Both rotations are composed first, so the velocities are only multiplied once.
+            radar_cs_record = _cache_transform(get("calibrated_sensor", sd_record["calibrated_sensor_token"]))
+            lidar_sd_record = get("sample_data", lidar_token)
+            lidar_cs_record = _cache_transform(get("calibrated_sensor", lidar_sd_record["calibrated_sensor_token"]))
+            velocities = np.zeros((3, pc.points.shape[1]))
+            velocities[:2, :] = pc.points[8:10, :]  # Compensated velocity
+            velocities = np.dot(np.dot(lidar_cs_record["_rotmat_T"], radar_cs_record["_rotmat"]), velocities)
+            velocities[2, :] = 0
 
             # Init axes.
             if ax is None:
@@ -986,8 +1422,8 @@ class LyftDatasetExplorer:
 
             # Show point cloud.
             points = view_points(pc.points[:3, :], np.eye(4), normalize=False)
-            dists = np.sqrt(np.sum(pc.points[:2, :] ** 2, axis=0))
-            colors = np.minimum(1, dists / axes_limit / np.sqrt(2))
+            dists = np.hypot(pc.points[0, :], pc.points[1, :])
+            colors = np.minimum(1.0, dists * inv_color_dist)
             sc = ax.scatter(points[0, :], points[1, :], c=colors, s=3)
 
             # Show velocities.
@@ -997,17 +1433,24 @@ class LyftDatasetExplorer:
             deltas_vel = 3 * deltas_vel  # Arbitrary scaling
             deltas_vel = np.clip(deltas_vel, -max_delta, max_delta)  # Arbitrary clipping
             colors_rgba = sc.to_rgba(colors)
-            for i in range(points.shape[1]):
-                ax.arrow(points[0, i], points[1, i], deltas_vel[0, i], deltas_vel[1, i], color=colors_rgba[i])
+            ax.quiver(
+                points[0, :],
+                points[1, :],
+                deltas_vel[0, :],
+                deltas_vel[1, :],
+                color=colors_rgba,
+                angles="xy",
+                scale_units="xy",
+                scale=1,
+                width=0.003,
+            )
 
             # Show ego vehicle.
             ax.plot(0, 0, "x", color="black")
 
             # Show boxes.
             if with_anns:
-                for box in boxes:
-                    c = np.array(self.get_color(box.name)) / 255.0
-                    box.render(ax, view=np.eye(4), colors=(c, c, c))
+                self._render_boxes(ax, boxes, view=np.eye(4))
 
             # Limit visible range.
             ax.set_xlim(-axes_limit, axes_limit)
@@ -1029,9 +1472,7 @@ class LyftDatasetExplorer:
 
             # Show boxes.
             if with_anns:
-                for box in boxes:
-                    c = np.array(self.get_color(box.name)) / 255.0
-                    box.render(ax, view=camera_intrinsic, normalize=True, colors=(c, c, c))
+                self._render_boxes(ax, boxes, view=camera_intrinsic, normalize=True)
 
             # Limit visible range.
             ax.set_xlim(0, data.size[0])
@@ -1045,7 +1486,12 @@ class LyftDatasetExplorer:
         ax.set_aspect("equal")
 
         if out_path is not None:
-            num = len([name for name in os.listdir(out_path)])
+            # Figures are numbered by the files in out_path. The directory is only listed for the first figure, each
+            # figure after that adds one file.
+            num = self._render_counters.get(out_path)
+            if num is None:
+                num = len(os.listdir(out_path))
+            self._render_counters[out_path] = num + 1
             out_path = out_path + str(num).zfill(5) + "_" + sample_data_token + ".png"
             plt.savefig(out_path)
             plt.close("all")
@@ -1095,7 +1541,7 @@ class LyftDatasetExplorer:
         data_path, boxes, camera_intrinsic = self.lyftd.get_sample_data(lidar, selected_anntokens=[ann_token])
         LidarPointCloud.from_file(data_path).render_height(axes[0], view=view)
         for box in boxes:
-            c = np.array(self.get_color(box.name)) / 255.0
+            c = self.get_color_normalized(box.name)
             box.render(axes[0], view=view, colors=(c, c, c))
             corners = view_points(boxes[0].corners(), view, False)[:2, :]
             axes[0].set_xlim([np.min(corners[0, :]) - margin, np.max(corners[0, :]) + margin])
@@ -1111,7 +1557,7 @@ class LyftDatasetExplorer:
         axes[1].axis("off")
         axes[1].set_aspect("equal")
         for box in boxes:
-            c = np.array(self.get_color(box.name)) / 255.0
+            c = self.get_color_normalized(box.name)
             box.render(axes[1], view=camera_intrinsic, normalize=True, colors=(c, c, c))
 
         if out_path is not None:
@@ -1128,18 +1574,22 @@ class LyftDatasetExplorer:
 
         """
 
+        get = self.lyftd.get
+        sample = self.lyftd.sample
+        columns = self.lyftd._ann_columns
         ann_tokens = self.lyftd.field2token("sample_annotation", "instance_token", instance_token)
-        closest = [np.inf, None]
-        for ann_token in ann_tokens:
-            ann_record = self.lyftd.get("sample_annotation", ann_token)
-            sample_record = self.lyftd.get("sample", ann_record["sample_token"])
-            sample_data_record = self.lyftd.get("sample_data", sample_record["data"]["LIDAR_TOP"])
-            pose_record = self.lyftd.get("ego_pose", sample_data_record["ego_pose_token"])
-            dist = np.linalg.norm(np.array(pose_record["translation"]) - np.array(ann_record["translation"]))
-            if dist < closest[0]:
-                closest[0] = dist
-                closest[1] = ann_token
-        self.render_annotation(closest[1], out_path=out_path)
+        ann_inds = [self.lyftd._token2ind["sample_annotation"][token] for token in ann_tokens]
+
+        # Gather the ego pose of the lidar sweep of each annotation's sample, then compare all at once.
+        pose_translations = []
+        for sample_ind in columns.sample_idx[ann_inds].tolist():
+            sample_data_record = get("sample_data", sample[sample_ind]["data"]["LIDAR_TOP"])
+            pose_translations.append(get("ego_pose", sample_data_record["ego_pose_token"])["translation"])
+
+        # Squared distances are enough to find the closest annotation.
+        diffs = np.array(pose_translations, dtype=np.float64) - columns.translation[ann_inds]
+        closest = ann_tokens[int(np.argmin(np.einsum("ij,ij->i", diffs, diffs)))]
+        self.render_annotation(closest, out_path=out_path)
 
     def render_scene(self, scene_token: str, freq: float = 10, image_width: int = 640, out_path: Path = None) -> None:
         """Renders a full scene with all surround view camera channels.
@@ -1155,10 +1605,12 @@ class LyftDatasetExplorer:
         if out_path is not None:
             assert out_path.suffix == ".avi"
 
+        get = self.lyftd.get
+
         # Get records from DB.
-        scene_rec = self.lyftd.get("scene", scene_token)
-        first_sample_rec = self.lyftd.get("sample", scene_rec["first_sample_token"])
-        last_sample_rec = self.lyftd.get("sample", scene_rec["last_sample_token"])
+        scene_rec = get("scene", scene_token)
+        first_sample_rec = get("sample", scene_rec["first_sample_token"])
+        last_sample_rec = get("sample", scene_rec["last_sample_token"])
 
         channels = ["CAM_FRONT_LEFT", "CAM_FRONT", "CAM_FRONT_RIGHT", "CAM_BACK_LEFT", "CAM_BACK", "CAM_BACK_RIGHT"]
 
@@ -1170,11 +1622,12 @@ class LyftDatasetExplorer:
         cv2.namedWindow(window_name)
         cv2.moveWindow(window_name, 0, 0)
 
-        # Load first sample_data record for each channel
+        # Index the sample_data records of each channel and load the first one.
+        scene_indexes = {channel: self._precompute_scene_index(scene_token, channel) for channel in channels}
         current_recs = {}  # Holds the current record to be displayed by channel.
         prev_recs = {}  # Hold the previous displayed record by channel.
         for channel in channels:
-            current_recs[channel] = self.lyftd.get("sample_data", first_sample_rec["data"][channel])
+            current_recs[channel] = get("sample_data", scene_indexes[channel].tokens[0])
             prev_recs[channel] = None
 
         # We assume that the resolution is the same for all surround view cameras.
@@ -1192,6 +1645,11 @@ class LyftDatasetExplorer:
         }
 
         canvas = np.ones((2 * image_size[1], 3 * image_size[0], 3), np.uint8)
+
+        # The panel of each channel on the canvas, as views that are written in place every frame.
+        canvas_views = {
+            channel: canvas[y : y + image_size[1], x : x + image_size[0]] for channel, (x, y) in layout.items()
+        }
         if out_path is not None:
             fourcc = cv2.VideoWriter_fourcc(*"MJPG")
             out = cv2.VideoWriter(str(out_path), fourcc, freq, canvas.shape[1::-1])
@@ -1204,11 +1662,10 @@ class LyftDatasetExplorer:
 
             current_time += time_step
 
-            # For each channel, find first sample that has time > current_time.
-            for channel, sd_rec in current_recs.items():
-                while sd_rec["timestamp"] < current_time and sd_rec["next"] != "":
-                    sd_rec = self.lyftd.get("sample_data", sd_rec["next"])
-                    current_recs[channel] = sd_rec
+            # For each channel, find first sample that has time >= current_time, or the last one.
+            for channel, scene_index in scene_indexes.items():
+                ind = min(int(np.searchsorted(scene_index.timestamps, current_time)), len(scene_index.tokens) - 1)
+                current_recs[channel] = get("sample_data", scene_index.tokens[ind])
 
             # Now add to canvas
             for channel, sd_rec in current_recs.items():
@@ -1224,20 +1681,22 @@ class LyftDatasetExplorer:
                     # Load and render
                     if not image_path.exists():
                         raise Exception("Error: Missing image %s" % image_path)
-                    im = cv2.imread(str(image_path))
+                    im, factor = _imread_reduced(image_path, (sd_rec["width"], sd_rec["height"]), image_size)
+                    if factor > 1:
+                        # Project the boxes into the downscaled image, with the line width they get after resizing.
+                        camera_intrinsic[:2, :] /= factor
+                    linewidth = max(1, 2 // factor)
                     for box in boxes:
                         c = self.get_color(box.name)
-                        box.render_cv2(im, view=camera_intrinsic, normalize=True, colors=(c, c, c))
+                        box.render_cv2(
+                            im, view=camera_intrinsic, normalize=True, colors=(c, c, c), linewidth=linewidth
+                        )
 
                     im = cv2.resize(im, image_size)
                     if channel in horizontal_flip:
                         im = im[:, ::-1, :]
 
-                    canvas[
-                        layout[channel][1] : layout[channel][1] + image_size[1],
-                        layout[channel][0] : layout[channel][0] + image_size[0],
-                        :,
-                    ] = im
+                    canvas_views[channel][...] = im
 
                     prev_recs[channel] = sd_rec  # Store here so we don't render the same image twice.
 
@@ -1293,10 +1752,11 @@ class LyftDatasetExplorer:
         if out_path is not None:
             assert out_path.suffix == ".avi"
 
+        get = self.lyftd.get
+
         # Get records from DB
-        scene_rec = self.lyftd.get("scene", scene_token)
-        sample_rec = self.lyftd.get("sample", scene_rec["first_sample_token"])
-        sd_rec = self.lyftd.get("sample_data", sample_rec["data"][channel])
+        scene_rec = get("scene", scene_token)
+        scene_index = self._precompute_scene_index(scene_token, channel)
 
         # Open CV init
         name = "{}: {} (Space to pause, ESC to exit)".format(scene_rec["name"], channel)
@@ -1309,21 +1769,23 @@ class LyftDatasetExplorer:
         else:
             out = None
 
-        has_more_frames = True
-        while has_more_frames:
+        for sd_token in scene_index.tokens:
 
             # Get data from DB
-            image_path, boxes, camera_intrinsic = self.lyftd.get_sample_data(
-                sd_rec["token"], box_vis_level=BoxVisibility.ANY
-            )
+            image_path, boxes, camera_intrinsic = self.lyftd.get_sample_data(sd_token, box_vis_level=BoxVisibility.ANY)
 
             # Load and render
             if not image_path.exists():
                 raise Exception("Error: Missing image %s" % image_path)
-            image = cv2.imread(str(image_path))
+            sd_rec = get("sample_data", sd_token)
+            image, factor = _imread_reduced(image_path, (sd_rec["width"], sd_rec["height"]), image_size)
+            if factor > 1:
+                # Project the boxes into the downscaled image, with the line width they get after resizing.
+                camera_intrinsic[:2, :] /= factor
+            linewidth = max(1, 2 // factor)
             for box in boxes:
                 c = self.get_color(box.name)
-                box.render_cv2(image, view=camera_intrinsic, normalize=True, colors=(c, c, c))
+                box.render_cv2(image, view=camera_intrinsic, normalize=True, colors=(c, c, c), linewidth=linewidth)
 
             # Render
             image = cv2.resize(image, image_size)
@@ -1339,11 +1801,6 @@ class LyftDatasetExplorer:
                 cv2.destroyAllWindows()
                 break
 
-            if not sd_rec["next"] == "":
-                sd_rec = self.lyftd.get("sample_data", sd_rec["next"])
-            else:
-                has_more_frames = False
-
         cv2.destroyAllWindows()
         if out_path is not None:
             out.release()
@@ -1383,6 +1840,7 @@ class LyftDatasetExplorer:
         if len(scene_tokens_location) == 0:
             print("Warning: Found 0 valid scenes for location %s!" % log_location)
 
+        get = self.lyftd.get
         map_poses = []
         map_mask = None
 
@@ -1390,51 +1848,38 @@ class LyftDatasetExplorer:
         for scene_token in tqdm(scene_tokens_location):
 
             # Get records from the database.
-            scene_record = self.lyftd.get("scene", scene_token)
-            log_record = self.lyftd.get("log", scene_record["log_token"])
-            map_record = self.lyftd.get("map", log_record["map_token"])
+            scene_record = get("scene", scene_token)
+            log_record = get("log", scene_record["log_token"])
+            map_record = get("map", log_record["map_token"])
             map_mask = map_record["mask"]
 
-            # For each sample in the scene, store the ego pose.
-            sample_tokens = self.lyftd.field2token("sample", "scene_token", scene_token)
-            for sample_token in sample_tokens:
-                sample_record = self.lyftd.get("sample", sample_token)
-
-                # Poses are associated with the sample_data. Here we use the lidar sample_data.
-                sample_data_record = self.lyftd.get("sample_data", sample_record["data"]["LIDAR_TOP"])
-                pose_record = self.lyftd.get("ego_pose", sample_data_record["ego_pose_token"])
+            # For each sample in the scene, gather the ego pose. Poses are associated with the sample_data. Here we
+            # use the lidar sample_data.
+            translations = []
+            for sample_token in self.lyftd.field2token("sample", "scene_token", scene_token):
+                sample_data_record = get("sample_data", get("sample", sample_token)["data"]["LIDAR_TOP"])
+                translations.append(get("ego_pose", sample_data_record["ego_pose_token"])["translation"])
+            translations = np.array(translations, dtype=np.float64).reshape(-1, 3)
 
-                # Calculate the pose on the map and append
-                map_poses.append(
-                    np.concatenate(
-                        map_mask.to_pixel_coords(pose_record["translation"][0], pose_record["translation"][1])
-                    )
-                )
+            # Calculate the poses on the map in one call and append
+            map_poses.append(np.stack(map_mask.to_pixel_coords(translations[:, 0], translations[:, 1]), axis=1))
 
         # Compute number of close ego poses.
         print("Creating plot...")
         map_poses = np.vstack(map_poses)
-        dists = sklearn.metrics.pairwise.euclidean_distances(map_poses * map_mask.resolution)
-        close_poses = np.sum(dists < close_dist, axis=0)
+        map_poses_meters = map_poses * map_mask.resolution
+        # Count the neighbours with a KD-tree radius query instead of materializing all pairwise distances. The
+        # radius is nudged below close_dist, as the query includes poses at exactly that distance.
+        close_poses = cKDTree(map_poses_meters).query_ball_point(
+            map_poses_meters, r=np.nextafter(close_dist, 0), return_length=True
+        )
 
-        if len(np.array(map_mask.mask()).shape) == 3 and np.array(map_mask.mask()).shape[2] == 3:
-            # RGB Colour maps
-            mask = map_mask.mask()
-        else:
+        mask = map_mask.mask()
+        if not (mask.ndim == 3 and mask.shape[2] == 3):
             # Monochrome maps
-            # Set the colors for the mask.
-            mask = Image.fromarray(map_mask.mask())
-            mask = np.array(mask)
-
-            maskr = color_fg[0] * np.ones(np.shape(mask), dtype=np.uint8)
-            maskr[mask == 0] = color_bg[0]
-            maskg = color_fg[1] * np.ones(np.shape(mask), dtype=np.uint8)
-            maskg[mask == 0] = color_bg[1]
-            maskb = color_fg[2] * np.ones(np.shape(mask), dtype=np.uint8)
-            maskb[mask == 0] = color_bg[2]
-            mask = np.concatenate(
-                (np.expand_dims(maskr, axis=2), np.expand_dims(maskg, axis=2), np.expand_dims(maskb, axis=2)), axis=2
-            )
+            # Set the colors for the mask with a lookup table indexed by the foreground flag of each pixel.
+            lut = np.array([color_bg, color_fg], dtype=np.uint8)
+            mask = lut[(mask != 0).view(np.uint8)]
 
         # Plot.
         _, ax = plt.subplots(1, 1, figsize=(10, 10))
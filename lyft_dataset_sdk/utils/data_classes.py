@@ -585,6 +585,31 @@ class Box:
         self.orientation = quaternion * self.orientation
         self.velocity = np.dot(quaternion.rotation_matrix, self.velocity)
 
+    @staticmethod
+    def transform_batch(boxes: List["Box"], translation: np.ndarray, quaternion: Quaternion) -> None:
+        """Translates and then rotates a list of boxes in place.
+
+        Equivalent to calling box.translate(translation) followed by box.rotate(quaternion) on every box, but centers
+        and velocities of all boxes are transformed with a single matrix product.
+
+        Args:
+            boxes: Boxes to transform.
+            translation: <np.float: 3>. Translation in x, y, z direction.
+            quaternion: Rotation to apply after the translation.
+
+        """
+        if len(boxes) == 0:
+            return
+
+        rotation_matrix_t = quaternion.rotation_matrix.T
+        centers = np.dot(np.stack([box.center for box in boxes]) + translation, rotation_matrix_t)
+        velocities = np.dot(np.stack([box.velocity for box in boxes]), rotation_matrix_t)
+
+        for box, center, velocity in zip(boxes, centers, velocities):
+            box.center = center
+            box.orientation = quaternion * box.orientation
+            box.velocity = velocity
+
     def corners(self, wlh_factor: float = 1.0) -> np.ndarray:
         """Returns the bounding box corners.
 
@@ -623,6 +648,28 @@ class Box:
         """
         return self.corners()[:, [2, 3, 7, 6]]
 
+    def line_segments(self, view: np.ndarray = np.eye(3), normalize: bool = False) -> np.ndarray:
+        """Returns the projected edges that render draws, as line segments, e.g. for a LineCollection.
+
+        Args:
+            view: <np.array: 3, 3>. Define a projection in needed (e.g. for drawing projection in an image).
+            normalize: Whether to normalize the remaining coordinate.
+
+        Returns: <np.float: 13, 2, 2>. Segments ((x0, y0), (x1, y1)) of the front rectangle (0-3), the rear
+            rectangle (4-7), the sides (8-11) and the line indicating the front (12).
+
+        """
+        corners = view_points(self.corners(), view, normalize=normalize)[:2, :].T
+
+        segments = np.empty((13, 2, 2))
+        for i in range(4):
+            segments[i] = corners[(i - 1) % 4], corners[i]  # Front rectangle.
+            segments[4 + i] = corners[4 + (i - 1) % 4], corners[4 + i]  # Rear rectangle.
+            segments[8 + i] = corners[i], corners[i + 4]  # Sides.
+        segments[12] = np.mean(corners[[2, 3, 7, 6]], axis=0), np.mean(corners[2:4], axis=0)
+
+        return segments
+
     def render(
         self,
         axis: Axes,
@@ -3,12 +3,25 @@
 # Licensed under the Creative Commons [see licence.txt]
 # Modified by Vladimir Iglovikov 2019.
 
+import math
 from enum import IntEnum
 from typing import Tuple
 
 import numpy as np
 from pyquaternion import Quaternion
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _jit(func):
+    """Compiles a numeric helper with numba if it is installed, otherwise returns it unchanged."""
+    if njit is None:
+        return func
+    return njit(cache=True, fastmath=True)(func)
+
 
 class BoxVisibility(IntEnum):
     """Enumerates the various level of box visibility in an image."""
@@ -181,3 +194,103 @@ def quaternion_yaw(q: Quaternion) -> float:
     yaw = np.arctan2(v[1], v[0])
 
     return yaw
+
+
+def quat_yaw(w: float, x: float, y: float, z: float) -> float:
+    """Calculates the yaw angle of a quaternion directly from its components. This is the same angle as pyquaternion's
+    Quaternion.yaw_pitch_roll[0], including its sign convention for the x * y term. The quaternion does not need to be
+    normalized.
+
+    Args:
+        w: Real part of the quaternion.
+        x: First imaginary part of the quaternion.
+        y: Second imaginary part of the quaternion.
+        z: Third imaginary part of the quaternion.
+
+    Returns: Yaw angle in radians, in [-pi, pi].
+
+    """
+    return math.atan2(2.0 * (w * z - x * y), w * w + x * x - y * y - z * z)
+
+
+@_jit
+def quat_to_rotmat(w: float, x: float, y: float, z: float) -> np.ndarray:
+    """Converts a quaternion to a rotation matrix with the closed-form expression, without going through
+    pyquaternion. The quaternion does not need to be normalized.
+
+    Args:
+        w: Real part of the quaternion.
+        x: First imaginary part of the quaternion.
+        y: Second imaginary part of the quaternion.
+        z: Third imaginary part of the quaternion.
+
+    Returns: <np.float: 3, 3>. Rotation matrix. For a unit quaternion its transpose is the inverse rotation.
+
+    """
+    s = 2.0 / (w * w + x * x + y * y + z * z)
+    wx, wy, wz = s * w * x, s * w * y, s * w * z
+    xx, xy, xz = s * x * x, s * x * y, s * x * z
+    yy, yz, zz = s * y * y, s * y * z, s * z * z
+
+    rotmat = np.empty((3, 3))
+    rotmat[0, 0], rotmat[0, 1], rotmat[0, 2] = 1.0 - (yy + zz), xy - wz, xz + wy
+    rotmat[1, 0], rotmat[1, 1], rotmat[1, 2] = xy + wz, 1.0 - (xx + zz), yz - wx
+    rotmat[2, 0], rotmat[2, 1], rotmat[2, 2] = xz - wy, yz + wx, 1.0 - (xx + yy)
+    return rotmat
+
+
+@_jit
+def qmul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Multiplies two quaternions with the Hamilton product. Like for pyquaternion's Quaternion, a * b is the
+    rotation b followed by the rotation a.
+
+    Args:
+        a: <np.float: 4>. Left quaternion (w, x, y, z).
+        b: <np.float: 4>. Right quaternion (w, x, y, z).
+
+    Returns: <np.float: 4>. The product a * b (w, x, y, z).
+
+    """
+    aw, ax, ay, az = a[0], a[1], a[2], a[3]
+    bw, bx, by, bz = b[0], b[1], b[2], b[3]
+
+    q = np.empty(4)
+    q[0] = aw * bw - ax * bx - ay * by - az * bz
+    q[1] = aw * bx + ax * bw + ay * bz - az * by
+    q[2] = aw * by - ax * bz + ay * bw + az * bx
+    q[3] = aw * bz + ax * by - ay * bx + az * bw
+    return q
+
+
+def slerp_quaternions(q0: np.ndarray, q1: np.ndarray, amount: float) -> np.ndarray:
+    """Spherical linear interpolation between pairs of quaternions, row by row.
+    Follows pyquaternion's Quaternion.slerp: the inputs are normalized, the shorter arc is taken and nearly
+    identical rotations are interpolated linearly.
+
+    Args:
+        q0: <np.float: n, 4>. Start quaternions (w, x, y, z).
+        q1: <np.float: n, 4>. End quaternions (w, x, y, z).
+        amount: Interpolation parameter between 0 (q0) and 1 (q1).
+
+    Returns: <np.float: n, 4>. Interpolated unit quaternions.
+
+    """
+    q0 = q0 / np.sqrt(np.sum(q0 * q0, axis=1)).reshape(-1, 1)
+    q1 = q1 / np.sqrt(np.sum(q1 * q1, axis=1)).reshape(-1, 1)
+    amount = min(max(amount, 0.0), 1.0)
+
+    # Flip q0 where needed so the interpolation takes the shorter arc.
+    dot = np.sum(q0 * q1, axis=1)
+    sign = np.where(dot < 0.0, -1.0, 1.0)
+    q0 = q0 * sign.reshape(-1, 1)
+    dot = dot * sign
+
+    # Interpolate linearly where sin(theta_0) is close to zero.
+    linear = dot > 0.9995
+    theta_0 = np.arccos(np.minimum(dot, 1.0))
+    sin_theta_0 = np.where(linear, 1.0, np.sin(theta_0))
+    s0 = np.where(linear, 1.0 - amount, np.sin((1.0 - amount) * theta_0) / sin_theta_0)
+    s1 = np.where(linear, amount, np.sin(amount * theta_0) / sin_theta_0)
+
+    q = s0.reshape(-1, 1) * q0 + s1.reshape(-1, 1) * q1
+    return q / np.sqrt(np.sum(q * q, axis=1)).reshape(-1, 1)
@@ -28,6 +28,7 @@ class MapMask:
         self.resolution = resolution
         self.foreground = 255
         self.background = 0
+        self._raw_mask = None  # Decoded on first use, see _base_mask.
 
     @cached(cache=LRUCache(maxsize=3))
     def mask(self, dilation: float = 0.0) -> np.ndarray:
@@ -101,12 +102,15 @@ class MapMask:
         return pixel_coords[0, :], pixel_coords[1, :]
 
     @property
-    @cached(cache=LRUCache(maxsize=1))
     def _base_mask(self) -> np.ndarray:
         """
-        Returns the original binary mask stored in map png file.
+        Returns the original binary mask stored in map png file. The png is decoded on first access and kept on the
+        instance, so masks of different maps do not evict each other.
         :return: <np.int8: image.height, image.width>. The binary mask.
         """
+        if self._raw_mask is not None:
+            return self._raw_mask
+
         # Pillow allows us to specify the maximum image size above, whereas this is more difficult in OpenCV.
         img = Image.open(self.img_file)
 
@@ -117,5 +121,5 @@ class MapMask:
         img = img.resize((size_x, size_y), resample=Image.NEAREST)
 
         # Convert to numpy.
-        raw_mask = np.array(img)
-        return raw_mask
+        self._raw_mask = np.array(img)
+        return self._raw_mask
@@ -0,0 +1,56 @@
+# Lyft Dataset SDK dev-kit.
+# Licensed under the Creative Commons [see licence.txt]
+
+import unittest
+
+import matplotlib.pyplot as plt
+import numpy as np
+from pyquaternion import Quaternion
+
+from lyft_dataset_sdk.utils.data_classes import Box
+
+
+class TestBox(unittest.TestCase):
+    def test_transform_batch(self):
+        """Test that Box.transform_batch matches translating and rotating every box on its own."""
+
+        rng = np.random.RandomState(0)
+        translation = np.array([1.0, -2.0, 0.5])
+        quaternion = Quaternion(axis=(0.1, 0.2, 1.0), angle=0.7)
+
+        boxes = [
+            Box(rng.randn(3), [2.0, 4.0, 1.5], Quaternion(axis=(0, 0, 1), angle=yaw), velocity=rng.randn(3))
+            for yaw in np.linspace(-np.pi, np.pi, 5)
+        ]
+        expected = [box.copy() for box in boxes]
+        for box in expected:
+            box.translate(translation)
+            box.rotate(quaternion)
+
+        Box.transform_batch(boxes, translation, quaternion)
+
+        for box, box_expected in zip(boxes, expected):
+            self.assertEqual(box, box_expected)
+
+        # An empty list is a no-op.
+        Box.transform_batch([], translation, quaternion)
+
+    def test_line_segments(self):
+        """Test that Box.line_segments returns the lines Box.render draws."""
+
+        box = Box([1.0, 2.0, 0.5], [2.0, 4.0, 1.5], Quaternion(axis=(0, 0, 1), angle=0.3))
+        view = np.array([[100.0, 0.0, 50.0], [0.0, 100.0, 40.0], [0.0, 0.0, 1.0]])
+
+        for normalize in [False, True]:
+            _, ax = plt.subplots()
+            box.render(ax, view=view, normalize=normalize)
+            expected = sorted(np.stack(line.get_data(), axis=1).round(6).tolist() for line in ax.lines)
+            plt.close("all")
+
+            segments = box.line_segments(view=view, normalize=normalize)
+            self.assertEqual(segments.shape, (13, 2, 2))
+            self.assertEqual(sorted(segments.round(6).tolist()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
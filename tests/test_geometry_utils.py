@@ -8,7 +8,14 @@ import numpy as np
 from pyquaternion import Quaternion
 
 from lyft_dataset_sdk.utils.data_classes import Box
-from lyft_dataset_sdk.utils.geometry_utils import points_in_box, quaternion_yaw
+from lyft_dataset_sdk.utils.geometry_utils import (
+    points_in_box,
+    qmul,
+    quat_to_rotmat,
+    quat_yaw,
+    quaternion_yaw,
+    slerp_quaternions,
+)
 
 
 class TestGeometryUtils(unittest.TestCase):
@@ -109,6 +116,67 @@ class TestGeometryUtils(unittest.TestCase):
             self.assertEqual(mask[0], True)
             self.assertEqual(mask[1], False)
 
+    def test_quat_yaw(self):
+        """Test quat_yaw() against pyquaternion's yaw_pitch_roll."""
+
+        rng = np.random.RandomState(0)
+        for q in rng.randn(20, 4):
+            # The quaternion is not normalized.
+            self.assertAlmostEqual(quat_yaw(*q), Quaternion(q).yaw_pitch_roll[0])
+
+        # Pure yaw rotations.
+        for yaw_in in np.linspace(-3, 3, 7):
+            self.assertAlmostEqual(quat_yaw(*Quaternion(axis=(0, 0, 1), angle=yaw_in).elements), yaw_in)
+
+    def test_quat_to_rotmat(self):
+        """Test quat_to_rotmat() against pyquaternion's rotation_matrix."""
+
+        rng = np.random.RandomState(0)
+        for q in rng.randn(20, 4):
+            # The quaternion is not normalized, pyquaternion normalizes it before building the matrix.
+            self.assertTrue(np.allclose(quat_to_rotmat(*q), Quaternion(q).rotation_matrix))
+
+        # Identity and a rotation of 90 degrees around the z axis.
+        self.assertTrue(np.allclose(quat_to_rotmat(1, 0, 0, 0), np.eye(3)))
+        q = Quaternion(axis=(0, 0, 1), angle=np.pi / 2)
+        self.assertTrue(np.allclose(quat_to_rotmat(*q.elements), [[0, -1, 0], [1, 0, 0], [0, 0, 1]]))
+
+    def test_qmul(self):
+        """Test qmul() against pyquaternion's quaternion product."""
+
+        rng = np.random.RandomState(0)
+        for a, b in zip(rng.randn(20, 4), rng.randn(20, 4)):
+            self.assertTrue(np.allclose(qmul(a, b), (Quaternion(a) * Quaternion(b)).elements))
+
+        # The product of unit quaternions composes their rotations.
+        a = Quaternion(axis=(0, 0, 1), angle=0.4)
+        b = Quaternion(axis=(1, 0, 0), angle=-1.2)
+        self.assertTrue(
+            np.allclose(quat_to_rotmat(*qmul(a.elements, b.elements)), np.dot(a.rotation_matrix, b.rotation_matrix))
+        )
+
+    def test_slerp_quaternions(self):
+        """Test slerp_quaternions() against pyquaternion's Quaternion.slerp."""
+
+        rng = np.random.RandomState(0)
+        q0 = [Quaternion(q) for q in rng.randn(20, 4)]
+        q1 = [Quaternion(q) for q in rng.randn(20, 4)]
+
+        # Opposite signs (shorter arc) and nearly identical rotations (linear interpolation).
+        q0.append(Quaternion(axis=(0, 0, 1), angle=0.3))
+        q1.append(-Quaternion(axis=(0, 0, 1), angle=0.5))
+        q0.append(Quaternion(axis=(0, 0, 1), angle=0.3))
+        q1.append(Quaternion(axis=(0, 0, 1), angle=0.30001))
+
+        for amount in [0.0, 0.25, 0.5, 1.0]:
+            q_test = slerp_quaternions(np.array([q.elements for q in q0]), np.array([q.elements for q in q1]), amount)
+            for a, b, q in zip(q0, q1, q_test):
+                q_true = Quaternion.slerp(Quaternion(a), Quaternion(b), amount=amount)
+                self.assertTrue(np.allclose(q_true.elements, q, atol=1e-6))
+
+        # No quaternions.
+        self.assertEqual(slerp_quaternions(np.zeros((0, 4)), np.zeros((0, 4)), 0.5).shape, (0, 4))
+
 
 if __name__ == "__main__":
     unittest.main()
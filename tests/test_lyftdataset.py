@@ -0,0 +1,281 @@
+# Lyft Dataset SDK dev-kit.
+# Licensed under the Creative Commons [see licence.txt]
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import cv2
+import matplotlib.pyplot as plt
+import numpy as np
+
+from lyft_dataset_sdk.lyftdataset import LyftDataset
+
+
+class DatasetTestCase(unittest.TestCase):
+    """Writes a tiny dataset to a temp dir: a 40 x 40 meter map, one scene with two samples, and a lidar sweep in
+    between them. One car is annotated in both samples, it moves by (4, 8, 0) meters and turns by 90 degrees, another
+    car only in the second sample. The tables that are not needed are left out."""
+
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp())
+        cv2.imwrite(str(self.path / "map.png"), np.zeros((400, 400), dtype=np.uint8))
+        identity = [1.0, 0.0, 0.0, 0.0]
+        yaw_90 = [math.cos(math.pi / 4), 0.0, 0.0, math.sin(math.pi / 4)]
+        size = [2.0, 4.0, 1.5]
+        tables = {
+            "category": [{"token": "category0", "name": "car", "description": ""}],
+            "instance": [
+                {"token": "instance0", "category_token": "category0", "nbr_annotations": 2},
+                {"token": "instance1", "category_token": "category0", "nbr_annotations": 1},
+            ],
+            "sample_annotation": [
+                {
+                    "token": "ann0",
+                    "sample_token": "sample0",
+                    "instance_token": "instance0",
+                    "translation": [0.0, 0.0, 0.0],
+                    "size": size,
+                    "rotation": identity,
+                    "prev": "",
+                    "next": "ann1",
+                },
+                {
+                    "token": "ann1",
+                    "sample_token": "sample1",
+                    "instance_token": "instance0",
+                    "translation": [4.0, 8.0, 0.0],
+                    "size": size,
+                    "rotation": yaw_90,
+                    "prev": "ann0",
+                    "next": "",
+                },
+                {
+                    "token": "ann2",
+                    "sample_token": "sample1",
+                    "instance_token": "instance1",
+                    "translation": [10.0, 0.0, 0.0],
+                    "size": size,
+                    "rotation": identity,
+                    "prev": "",
+                    "next": "",
+                },
+            ],
+            "sensor": [{"token": "sensor0", "channel": "LIDAR_TOP", "modality": "lidar"}],
+            "calibrated_sensor": [
+                {
+                    "token": "cs0",
+                    "sensor_token": "sensor0",
+                    "translation": [0.0, 0.0, 0.0],
+                    "rotation": identity,
+                    "camera_intrinsic": [],
+                }
+            ],
+            "ego_pose": [
+                {"token": "pose0", "timestamp": 0, "translation": [20.0, 20.0, 0.0], "rotation": identity},
+                {"token": "pose1", "timestamp": 250000, "translation": [11.9, 20.0, 0.0], "rotation": identity},
+                {"token": "pose2", "timestamp": 1000000, "translation": [20.0, 20.0, 0.0], "rotation": identity},
+            ],
+            "log": [{"token": "log0"}],
+            "map": [{"token": "map0", "filename": "map.png", "log_tokens": ["log0"]}],
+            "scene": [{"token": "scene0", "log_token": "log0", "first_sample_token": "sample0"}],
+            "sample": [
+                {"token": "sample0", "timestamp": 0, "scene_token": "scene0", "prev": "", "next": "sample1"},
+                {"token": "sample1", "timestamp": 1000000, "scene_token": "scene0", "prev": "sample0", "next": ""},
+            ],
+            "sample_data": [
+                {
+                    "token": "sd0",
+                    "sample_token": "sample0",
+                    "ego_pose_token": "pose0",
+                    "calibrated_sensor_token": "cs0",
+                    "timestamp": 0,
+                    "is_key_frame": True,
+                    "filename": "lidar/sd0.bin",
+                },
+                {
+                    "token": "sd1",
+                    "sample_token": "sample1",
+                    "ego_pose_token": "pose1",
+                    "calibrated_sensor_token": "cs0",
+                    "timestamp": 250000,
+                    "is_key_frame": False,
+                    "filename": "lidar/sd1.bin",
+                },
+                {
+                    "token": "sd2",
+                    "sample_token": "sample1",
+                    "ego_pose_token": "pose2",
+                    "calibrated_sensor_token": "cs0",
+                    "timestamp": 1000000,
+                    "is_key_frame": True,
+                    "filename": "lidar/sd2.bin",
+                },
+            ],
+        }
+        for table, records in tables.items():
+            with open(str(self.path / "{}.json".format(table)), "w") as f:
+                json.dump(records, f)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.path))
+
+    def load(self, **kwargs) -> LyftDataset:
+        kwargs.setdefault("missing_tables_ok", True)
+        return LyftDataset(data_path=str(self.path), json_path=str(self.path), verbose=False, **kwargs)
+
+
+class TestAnnotations(DatasetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lyftd = self.load()
+
+    def test_get_boxes_key_frame(self):
+        """Test that the boxes of a key frame are the annotations of its sample."""
+
+        boxes = self.lyftd.get_boxes("sd2")
+        self.assertEqual([box.token for box in boxes], ["ann1", "ann2"])
+        self.assertTrue(np.allclose(boxes[0].center, [4.0, 8.0, 0.0]))
+        yaw_90 = [math.cos(math.pi / 4), 0.0, 0.0, math.sin(math.pi / 4)]
+        self.assertTrue(np.allclose(boxes[0].orientation.elements, yaw_90))
+
+    def test_get_boxes_sweep(self):
+        """Test that the boxes of a sweep a quarter of the way between two samples are interpolated."""
+
+        boxes = self.lyftd.get_boxes("sd1")
+        self.assertEqual([box.token for box in boxes], ["ann1", "ann2"])
+        self.assertEqual([box.name for box in boxes], ["car", "car"])
+
+        # Moved and turned by a quarter.
+        self.assertTrue(np.allclose(boxes[0].center, [1.0, 2.0, 0.0]))
+        self.assertTrue(np.allclose(boxes[0].wlh, [2.0, 4.0, 1.5]))
+        yaw_22_5 = [math.cos(math.pi / 16), 0.0, 0.0, math.sin(math.pi / 16)]
+        self.assertTrue(np.allclose(boxes[0].orientation.elements, yaw_22_5))
+
+        # No previous annotation, so it stays where it is annotated.
+        self.assertTrue(np.allclose(boxes[1].center, [10.0, 0.0, 0.0]))
+        self.assertTrue(np.allclose(boxes[1].orientation.elements, [1.0, 0.0, 0.0, 0.0]))
+
+    def test_box_velocity(self):
+        """Test velocities from the next, the previous and no other annotation."""
+
+        self.assertTrue(np.allclose(self.lyftd.box_velocity("ann0"), [4.0, 8.0, 0.0]))
+        self.assertTrue(np.allclose(self.lyftd.box_velocity("ann1"), [4.0, 8.0, 0.0]))
+        self.assertTrue(np.all(np.isnan(self.lyftd.box_velocity("ann2"))))
+        self.assertTrue(np.all(np.isnan(self.lyftd.box_velocity("ann0", max_time_diff=0.5))))
+
+
+class TestFieldToToken(DatasetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lyftd = self.load()
+
+    def test_hashable_field(self):
+        """Test a query on a field with hashable values, which is served from the hash index."""
+
+        self.assertEqual(self.lyftd.field2token("sample_data", "sample_token", "sample1"), ["sd1", "sd2"])
+        self.assertEqual(self.lyftd.field2token("sample_data", "is_key_frame", False), ["sd1"])
+        # Served from the index built by the first query.
+        self.assertEqual(self.lyftd.field2token("sample_data", "sample_token", "sample0"), ["sd0"])
+
+    def test_list_field(self):
+        """Test a query on a field with list values, which can't be hashed and is scanned instead."""
+
+        self.assertEqual(self.lyftd.field2token("map", "log_tokens", ["log0"]), ["map0"])
+        self.assertEqual(self.lyftd.field2token("calibrated_sensor", "camera_intrinsic", []), ["cs0"])
+
+    def test_unhashable_query(self):
+        """Test an unhashable query on a field with hashable values."""
+
+        self.assertEqual(self.lyftd.field2token("sample_data", "sample_token", "sample1"), ["sd1", "sd2"])
+        self.assertEqual(self.lyftd.field2token("sample_data", "sample_token", ["sample1"]), [])
+
+    def test_missing_value(self):
+        """Test that a value no record has matches nothing."""
+
+        self.assertEqual(self.lyftd.field2token("sample_data", "sample_token", "sample2"), [])
+        self.assertEqual(self.lyftd.field2token("map", "log_tokens", ["log1"]), [])
+
+
+class TestRender(DatasetTestCase):
+    def test_ego_centric_map(self):
+        """Test the ego centric map crop inside the map and close to its edge."""
+
+        lyftd = self.load()
+
+        _, ax = plt.subplots()
+        lyftd.explorer.render_ego_centric_map("sd0", axes_limit=10, ax=ax)
+        self.assertEqual(ax.images[0].get_array().shape, (200, 200))
+        plt.close()
+
+        # The pose of sd1 is closer than axes_limit * sqrt(2) to the left edge, which leaves nothing to rotate.
+        _, ax = plt.subplots()
+        lyftd.explorer.render_ego_centric_map("sd1", axes_limit=10, ax=ax)
+        self.assertEqual(ax.images[0].get_array().shape, (200, 0))
+        plt.close()
+
+
+class TestCache(DatasetTestCase):
+    def load(self, **kwargs) -> LyftDataset:
+        return super().load(use_cache=True, **kwargs)
+
+    def cache_paths(self):
+        return sorted(self.path.glob(".cache_*.pkl"))
+
+    def test_load_from_cache(self):
+        """Test that a second instance is restored from the cache instead of being indexed again."""
+
+        lyftd = self.load()
+        cache_paths = self.cache_paths()
+        self.assertEqual(len(cache_paths), 1)
+        self.assertEqual(list(self.path.glob("*.tmp")), [])
+
+        with mock.patch.object(LyftDataset, "__make_reverse_index__", side_effect=AssertionError):
+            cached = self.load()
+
+        self.assertEqual(cached.sample, lyftd.sample)
+        self.assertEqual(cached.get("category", "category0")["name"], "car")
+        self.assertEqual(cached.get("log", "log0")["map_token"], "map0")
+        self.assertEqual(self.cache_paths(), cache_paths)
+
+    def test_stale_cache_removed(self):
+        """Test that changing a json file changes the cache key and removes the stale cache."""
+
+        self.load()
+        (old_cache_path,) = self.cache_paths()
+
+        filepath = str(self.path / "sample.json")
+        stat = os.stat(filepath)
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        lyftd = self.load()
+        self.assertEqual(lyftd.get("log", "log0")["map_token"], "map0")
+
+        cache_paths = self.cache_paths()
+        self.assertEqual(len(cache_paths), 1)
+        self.assertNotEqual(cache_paths[0], old_cache_path)
+        self.assertFalse(old_cache_path.exists())
+
+    def test_missing_tables_not_ok(self):
+        """Test that a cache built with missing tables is not used when missing tables are not allowed."""
+
+        self.load()
+        self.assertEqual(len(self.cache_paths()), 1)
+
+        with self.assertRaises(FileNotFoundError):
+            self.load(missing_tables_ok=False)
+
+    def test_permissions(self):
+        """Test that the cache file gets the default permissions rather than those of a temp file."""
+
+        self.load()
+        (cache_path,) = self.cache_paths()
+
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(cache_path.stat().st_mode & 0o777, 0o666 & ~umask)